@@ -1,54 +1,217 @@
 # app.py - The backend for my sentiment analyzer project
 
 # First, gotta import all the tools we need
-from flask import Flask, request, jsonify, render_template # Flask is for the web server part
+from flask import Flask, request, jsonify, render_template, Response # Flask is for the web server part
 import requests # This lets us get stuff from web pages/APIs
+from requests.adapters import HTTPAdapter # Lets me keep connections open and reuse them
+from urllib3.util.retry import Retry # For automatically retrying when TMDb hiccups
+from concurrent.futures import ThreadPoolExecutor # For fetching review pages at the same time
+import threading # For the lock that protects the reviews cache
+from cachetools import TTLCache, LRUCache # Caches that expire / forget the oldest stuff
+import hashlib # For turning each review into a short fingerprint
+import numpy as np # For handling the arrays of predictions
+import queue # For passing progress updates from the worker thread to the browser
+import orjson # A much faster JSON library than the built-in one
 import joblib # For loading my saved model
+import os # For reading environment variables
 
 # Initialize the Flask application. This is like the main engine.
 app = Flask(__name__)
+# A request is just a movie title, so anything bigger than 16KB is junk. Flask rejects it
+# before my code even reads it.
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024
+# The longest movie title I'll accept.
+MAX_MOVIE_TITLE_LENGTH = 200
 
-# --- IMPORTANT: PASTE YOUR TMDB API KEY HERE ---
-# This is the secret key I got from the TMDb website.
-TMDB_API_KEY = "391f9c14603803d3fe13085a81d3a962" 
+# --- IMPORTANT: SET YOUR TMDB API KEY ---
+# This is the secret key I got from the TMDb website. It's read from the TMDB_API_KEY
+# environment variable so it doesn't end up in the code on GitHub. Run it like:
+#     TMDB_API_KEY=your_key_here gunicorn -c gunicorn_conf.py app:app
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY')
 
 # --- Load the AI model and the vectorizer ---
 # These are the files I made with the Jupyter notebook.
-# I need to load them when the server starts so they're ready to use.
-print("Server is starting up... trying to load my saved model files.")
-try:
-    # Load the vectorizer first. This turns words into numbers.
-    print("Loading vectorizer.pkl...")
-    my_vectorizer = joblib.load('vectorizer.pkl')
-    print("Vectorizer seems to be loaded okay.")
-
-    # Now load the actual sentiment model.
-    print("Loading sentiment_model.pkl...")
-    my_model = joblib.load('sentiment_model.pkl')
-    print("Sentiment model seems to be loaded okay.")
-
-    print("\n--- Looks like the model and vectorizer are ready! ---")
-
-except Exception as e:
-    # If something goes wrong here, the app can't work.
-    print("!!! BIG ERROR: Could not load the model files. !!!")
-    print(f"The error was: {e}")
-    my_model = None
-    my_vectorizer = None
+# NOTE: the vectorizer.pkl and sentiment_model.pkl in the repo are still from the older version of
+# the notebook, so vectorizer.pkl is a TfidfVectorizer with a 10,000-word vocabulary. The notebook
+# now trains a HashingVectorizer + TfidfTransformer instead, so re-run it (it needs the IMDb
+# dataset) to get the smaller, dictionary-free vectorizer. The code below works with either one.
+# They don't get loaded when the server starts anymore. Instead they're loaded the first time
+# someone actually asks for an analysis, so the server starts instantly and doesn't use the
+# memory until it needs to.
+# mmap_mode='r' means the big numpy arrays inside aren't copied into memory. The OS reads them
+# straight from the file when they're needed, and if several server processes load the same
+# file they all share one copy. (This only works because the notebook saves them uncompressed.)
+my_model = None
+my_vectorizer = None
+# The model's weights as one flat array plus its bias number (filled in by _load_models).
+model_weights = None
+model_bias = 0.0
+models_load_attempted = False
+# The lock makes sure two requests arriving at the same time don't both load the files.
+models_load_lock = threading.Lock()
+
+def _load_models():
+    global my_model, my_vectorizer, model_weights, model_bias, score_reviews_csr, models_load_attempted
+    # Quick check without the lock, so every request after the first one doesn't have to wait.
+    if models_load_attempted:
+        return
+    with models_load_lock:
+        # Another request might have loaded them while I was waiting for the lock.
+        if models_load_attempted:
+            return
+        print("First analysis request... trying to load my saved model files.")
+        try:
+            # Load the vectorizer first. This turns words into numbers.
+            print("Loading vectorizer.pkl...")
+            my_vectorizer = joblib.load('vectorizer.pkl', mmap_mode='r')
+            print("Vectorizer seems to be loaded okay.")
+
+            # Now load the actual sentiment model.
+            print("Loading sentiment_model.pkl...")
+            my_model = joblib.load('sentiment_model.pkl', mmap_mode='r')
+            print("Sentiment model seems to be loaded okay.")
+
+            # Logistic regression predicts positive when (review vector . weights + bias) > 0, so I
+            # pull those out once here and do the math myself instead of calling predict(), which
+            # re-checks the input and maps labels on every call.
+            # The model's weights are float64, but float32 is plenty for this and half the size,
+            # so the multiply has half as much memory to read through.
+            # I also tried squashing them down to int8, but that changed 66 out of 5000 predictions
+            # compared to predict(), and with only 10,000 weights (40KB as float32) it didn't make
+            # anything measurably faster. So they stay float32.
+            # (The notebook saves the GridSearchCV, so the real model is inside best_estimator_.)
+            linear_model = getattr(my_model, 'best_estimator_', my_model)
+            model_weights = linear_model.coef_.astype(np.float32).ravel()
+            model_bias = float(linear_model.intercept_[0])
+
+            # Compile the scoring function with numba now. numba itself is only imported here
+            # because importing it is slow, and the server should start fast (see above).
+            # Then run it once on an empty batch so the compiling happens while the model loads,
+            # not in the middle of scoring. So the first analysis in each worker waits for this, but
+            # cache=True saves the compiled code to disk, so after the very first time it's quick.
+            # (An empty CSR matrix is just indptr=[0] with no data, using the same types the vectorizer gives.)
+            from numba import njit
+            score_reviews_csr = njit(cache=True)(score_reviews_csr_python)
+            score_reviews_csr(np.zeros(1, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32),
+                              model_weights, model_bias, np.zeros(0, dtype=np.int8))
+
+            print("\n--- Looks like the model and vectorizer are ready! ---")
+
+        except Exception as e:
+            # If something goes wrong here, the app can't work.
+            print("!!! BIG ERROR: Could not load the model files. !!!")
+            print(f"The error was: {e}")
+            my_model = None
+            my_vectorizer = None
+            model_weights = None
+        models_load_attempted = True
 
 # --- Here are the functions for talking to the TMDb API ---
 
+# One shared Session for every TMDb call. Plain requests.get() opens a brand new
+# TCP + TLS connection every time, but a Session keeps them alive in a pool,
+# so the second call (and other users' calls) skip the handshake.
+TMDB_SESSION = requests.Session()
+TMDB_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    # Retry a few times if TMDb rate-limits us or has a server error.
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+))
+# Tell TMDb I want JSON back. (requests already asks for compressed responses by itself,
+# so Accept-Encoding is left alone.)
+TMDB_SESSION.headers.update({'Accept': 'application/json'})
+# Every TMDb call needs the API key, so the session adds it to every request by itself.
+TMDB_SESSION.params = {'api_key': TMDB_API_KEY}
+# (connect timeout, read timeout) in seconds so a slow TMDb can't hang the server forever.
+TMDB_TIMEOUT = (3.05, 10)
+
+# A pool of worker threads for fetching review pages at the same time.
+# It's made once here so every request reuses the same threads.
+TMDB_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+# --- Redis TMDb response cache (optional) ---
+# The caches below are lost whenever the server restarts. If REDIS_URL is set (like
+# redis://localhost:6379/0), TMDb responses are also saved in Redis, so they survive a restart
+# and all the gunicorn worker processes share them instead of each asking TMDb on its own.
+# redis is only imported when it's actually used, so the app runs fine without it installed.
+# The short socket timeout means a broken Redis just slows things down a tiny bit instead of hanging.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    import redis
+    TMDB_REDIS = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+else:
+    TMDB_REDIS = None
+# How long to keep TMDb responses in Redis. Search results basically never change, reviews do.
+SEARCH_REDIS_SECONDS = 3600
+REVIEWS_REDIS_SECONDS = 600
+
+# This gets a TMDb URL and gives back its JSON, checking the Redis cache first if there is one.
+def fetch_tmdb_json(api_url, api_params, cache_seconds):
+    # The full URL with the params (like '...search/movie?query=Inception') is the cache key.
+    # The API key isn't in it because the session only adds that when the request is sent.
+    cache_key = "tmdb:" + requests.Request('GET', api_url, params=api_params).prepare().url
+    
+    if TMDB_REDIS is not None:
+        try:
+            cached_response = TMDB_REDIS.get(cache_key)
+            if cached_response is not None:
+                return orjson.loads(cached_response)
+        except redis.RedisError as e:
+            # If Redis is down, just go to TMDb like normal.
+            print(f"Couldn't read from Redis: {e}")
+    
+    # Use the shared session to get the data from that URL.
+    response_from_api = TMDB_SESSION.get(api_url, params=api_params, timeout=TMDB_TIMEOUT)
+    # If TMDb answered with an error (like 401 for a bad API key), stop here with an exception.
+    # Otherwise the error page would look like "no results" and the movie would seem not to exist.
+    response_from_api.raise_for_status()
+    
+    # Convert the response to JSON so it's easy to work with.
+    # orjson reads the raw bytes directly, so there's no extra step decoding them to a string first.
+    response_data = orjson.loads(response_from_api.content)
+    
+    # Only save responses that actually found something. Same as the caches below, an empty
+    # "results" (movie not found, no reviews yet) shouldn't stick around after TMDb adds them.
+    if TMDB_REDIS is not None and response_data.get('results'):
+        try:
+            TMDB_REDIS.set(cache_key, response_from_api.content, ex=cache_seconds)
+        except redis.RedisError as e:
+            print(f"Couldn't save to Redis: {e}")
+    
+    return response_data
+
+# --- Caches so popular movies don't hit TMDb every single time ---
+# A movie's ID never changes, so found IDs can just be kept in an LRU cache. Reviews DO change
+# when people post new ones, so those expire after the same ten minutes as in Redis
+# (a longer time here would just hide the Redis one).
+# Only real answers get saved. "Not found" and "no reviews" aren't, because TMDb might add the
+# movie or its first review any minute, and I don't want that stuck in here until a restart.
+# The locks are there because Flask can handle several requests at once and these caches aren't thread-safe.
+MOVIE_ID_CACHE = LRUCache(maxsize=4096)
+MOVIE_ID_CACHE_LOCK = threading.Lock()
+REVIEWS_CACHE = TTLCache(maxsize=1024, ttl=REVIEWS_REDIS_SECONDS)
+REVIEWS_CACHE_LOCK = threading.Lock()
+
 # This function takes a movie name and finds its ID number.
 def find_movie_id_from_tmdb(title):
     print(f"Searching for movie ID for: '{title}'")
+    
+    # If I already found this movie before, just use the saved ID.
+    with MOVIE_ID_CACHE_LOCK:
+        cached_movie_id = MOVIE_ID_CACHE.get(title)
+    if cached_movie_id is not None:
+        print(f"Using cached movie ID: {cached_movie_id}")
+        return cached_movie_id
+    
     # This is the URL for the TMDb search API.
-    # I have to put my API key and the movie title in it.
-    api_search_url = f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={title}"
+    api_search_url = "https://api.themoviedb.org/3/search/movie"
+    # The movie title goes in as a param (the session adds the API key), and requests builds the
+    # query string for me (it also escapes things like spaces and '&' in the title properly).
+    search_params = {'query': title}
     
-    # Use requests to get the data from that URL.
-    response_from_api = requests.get(api_search_url)
-    # Convert the response to JSON so it's easy to work with.
-    data_from_api = response_from_api.json()
+    # Get the data from that URL (or from Redis if someone searched for this recently).
+    data_from_api = fetch_tmdb_json(api_search_url, search_params, SEARCH_REDIS_SECONDS)
     
     # The results are inside a list called 'results'.
     # I'll check if the list is not empty.
@@ -57,34 +220,145 @@ def find_movie_id_from_tmdb(title):
         first_result = data_from_api['results'][0]
         movie_id = first_result['id']
         print(f"Found movie ID: {movie_id}")
+        # Save it for next time.
+        with MOVIE_ID_CACHE_LOCK:
+            MOVIE_ID_CACHE[title] = movie_id
         return movie_id
     else:
         # If the 'results' list is empty, the movie wasn't found.
         print(f"Could not find any movie with the title '{title}'.")
         return None
 
+# This helper grabs one page of reviews. TMDb only sends back ~20 reviews per page,
+# so movies with lots of reviews are split over several pages.
+def fetch_review_page(movie_id, page_number):
+    # This is the URL for the reviews API endpoint.
+    api_reviews_url = f"https://api.themoviedb.org/3/movie/{movie_id}/reviews"
+    review_params = {'page': page_number}
+    
+    # Get the data from the reviews URL (or from Redis if it was fetched recently).
+    return fetch_tmdb_json(api_reviews_url, review_params, REVIEWS_REDIS_SECONDS)
+
+# This just pulls the 'content' part out of each review on a page.
+def get_review_texts_from_page(page_data):
+    list_of_reviews = []
+    if page_data.get('results'):
+        for review_item in page_data['results']:
+            list_of_reviews.append(review_item['content'])
+    return list_of_reviews
+
 # This function gets all the reviews for a movie using its ID.
 def get_reviews_for_movie(movie_id):
     print(f"Getting reviews for movie ID: {movie_id}")
-    # This is the URL for the reviews API endpoint.
-    api_reviews_url = f"https://api.themoviedb.org/3/movie/{movie_id}/reviews?api_key={TMDB_API_KEY}"
     
-    # Get the data from the reviews URL.
-    response_from_api = requests.get(api_reviews_url)
-    data_from_api = response_from_api.json()
+    # If I already fetched these reviews recently, just use the saved copy.
+    with REVIEWS_CACHE_LOCK:
+        cached_reviews = REVIEWS_CACHE.get(movie_id)
+    if cached_reviews is not None:
+        print(f"Using {len(cached_reviews)} cached reviews.")
+        return cached_reviews
     
-    # The reviews are in a list called 'results'.
-    # I need to loop through them and just get the 'content' part of each review.
-    list_of_reviews = []
-    if data_from_api.get('results'):
-        all_review_data = data_from_api['results']
-        for review_item in all_review_data:
-            review_text = review_item['content']
-            list_of_reviews.append(review_text)
+    # Get the first page. It also tells me how many pages there are in total.
+    first_page_data = fetch_review_page(movie_id, 1)
+    list_of_reviews = get_review_texts_from_page(first_page_data)
+    total_pages = first_page_data.get('total_pages') or 1
+    
+    # If there are more pages, fetch all of them at the same time instead of one by one.
+    # The threads spend almost all their time waiting on the network, so this works fine.
+    # (I looked at making this an async view with httpx instead, but Flask runs every async view
+    # in its own brand new event loop, so one shared AsyncClient can't be reused between requests.
+    # Threads + the pooled session get the same overlap without losing the kept-alive connections.)
+    if total_pages > 1:
+        print(f"There are {total_pages} pages of reviews, fetching the rest in parallel...")
+        other_pages = TMDB_EXECUTOR.map(lambda page_number: fetch_review_page(movie_id, page_number),
+                                        range(2, total_pages + 1))
+        # map() gives the pages back in order, so the reviews stay in TMDb's order.
+        for page_data in other_pages:
+            list_of_reviews.extend(get_review_texts_from_page(page_data))
+    
+    # Save them for next time (but not an empty list, see the note above the caches).
+    if list_of_reviews:
+        with REVIEWS_CACHE_LOCK:
+            REVIEWS_CACHE[movie_id] = list_of_reviews
     
     print(f"Found {len(list_of_reviews)} reviews.")
     return list_of_reviews
 
+# --- Here's the part that runs the reviews through the AI model ---
+
+# TMDb gives back the same review text every time, so there's no point predicting it twice.
+# I remember every prediction using a short hash of the review as the key (the full text can be huge).
+# blake2b is faster than sha256 and 16 bytes is plenty to avoid collisions.
+PREDICTION_CACHE = LRUCache(maxsize=100000)
+PREDICTION_CACHE_LOCK = threading.Lock()
+
+def make_review_key(review_text):
+    return hashlib.blake2b(review_text.encode('utf-8'), digest_size=16).digest()
+
+# This scores every review in one go. The vectorizer gives back a "CSR" sparse matrix, which
+# is three arrays: data (the non-zero numbers), indices (which column each one is in) and
+# indptr (where each review's numbers start and end). For each review I add up
+# number * weight over just its non-zero columns, then add the bias.
+# _load_models() has numba compile this to machine code and saves it as score_reviews_csr
+# (cache=True saves that to disk so it's only done once).
+# I don't use parallel=True here: numba's default parallel backend can't be called from several
+# threads at once, and the server already runs different users' requests on different threads.
+def score_reviews_csr_python(indptr, indices, data, weights, bias, predictions_out):
+    for i in range(len(indptr) - 1):
+        review_score = 0.0
+        for k in range(indptr[i], indptr[i + 1]):
+            review_score += data[k] * weights[indices[k]]
+        predictions_out[i] = review_score + bias > 0
+
+# The compiled version of score_reviews_csr_python (filled in by _load_models).
+score_reviews_csr = None
+
+# This function takes a list of reviews and gives back a 0 or 1 prediction for each one.
+def predict_sentiments(reviews_list):
+    # Sometimes the exact same review shows up more than once (cross-posts, pages overlapping).
+    # So I only work on each different review once, and copy the answers back at the end.
+    # unique_position_of_each_review[i] says which unique review reviews_list[i] is.
+    unique_reviews, unique_position_of_each_review = np.unique(
+        np.array(reviews_list, dtype=object), return_inverse=True)
+    unique_reviews = unique_reviews.tolist()
+    
+    review_keys = [make_review_key(review_text) for review_text in unique_reviews]
+    sentiment_predictions = np.zeros(len(unique_reviews), dtype=np.int64)
+    
+    # Split the reviews into ones I already know the answer for and ones I still have to predict.
+    missing_indexes = []
+    with PREDICTION_CACHE_LOCK:
+        for i, review_key in enumerate(review_keys):
+            cached_prediction = PREDICTION_CACHE.get(review_key)
+            if cached_prediction is None:
+                missing_indexes.append(i)
+            else:
+                sentiment_predictions[i] = cached_prediction
+    
+    print(f"{len(unique_reviews)} different reviews: {len(unique_reviews) - len(missing_indexes)} predictions "
+          f"were cached, {len(missing_indexes)} need the model.")
+    
+    if missing_indexes:
+        # First, convert the new review sentences into numbers using the vectorizer.
+        # The vectorizer gives back float64 numbers, so I switch them to float32 to match the model.
+        reviews_vectorized = my_vectorizer.transform(
+            [unique_reviews[i] for i in missing_indexes]).astype(np.float32, copy=False)
+        # Now, use the model's weights to score each review. A score above 0 means
+        # positive (1), otherwise negative (0). The model's classes are [0, 1], so this
+        # gives the same answers as my_model.predict().
+        new_predictions = np.zeros(reviews_vectorized.shape[0], dtype=np.int8)
+        score_reviews_csr(reviews_vectorized.indptr, reviews_vectorized.indices, reviews_vectorized.data,
+                          model_weights, model_bias, new_predictions)
+        
+        # Put the new predictions in the right spots and remember them for next time.
+        sentiment_predictions[missing_indexes] = new_predictions
+        with PREDICTION_CACHE_LOCK:
+            for i, prediction in zip(missing_indexes, new_predictions):
+                PREDICTION_CACHE[review_keys[i]] = int(prediction)
+    
+    # Copy each unique review's prediction back to every place it appeared in the original list.
+    return sentiment_predictions[unique_position_of_each_review.ravel()]
+
 # --- These are the routes for the website ---
 
 # This is the main page of the app (like the homepage).
@@ -95,95 +369,214 @@ def show_main_page():
     print("A user visited the home page.")
     return render_template('index.html')
 
+# --- Analysis jobs ---
+# Fetching and analyzing all the reviews can take a few seconds, and before this the browser
+# just sat there with a spinner. Now /analyze answers with a stream of Server-Sent Events
+# (SSE) instead of one big JSON at the end: updates (like "fetching reviews, 30%") show up as
+# the job goes, and the final results arrive as the last event. Because it all happens inside
+# the one /analyze request, it doesn't matter which server process handles it.
+# The actual work runs as a "job" on a fixed pool of threads and puts its updates into a queue,
+# which the /analyze response reads from. If too many jobs are already running or waiting,
+# /analyze answers 503 ("busy, try again later") instead of taking on more.
+ANALYSIS_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+# How many threads each gunicorn worker has (gunicorn_conf.py uses this number too).
+SERVER_THREADS = 32
+# Every analysis holds on to one of the server's threads while its events stream out, so this
+# has to stay well below SERVER_THREADS. Otherwise all the threads could be stuck streaming and
+# nothing would be left for the home page, or even for sending the 503.
+MAX_PENDING_JOBS = SERVER_THREADS - 8
+pending_job_count = 0
+pending_job_count_lock = threading.Lock()
+# How long to wait between "still working" heartbeats, and how long to wait with no updates before giving up.
+JOB_HEARTBEAT_SECONDS = 15
+JOB_TIMEOUT_SECONDS = 120
+
+# Small helper for putting a progress update into a job's queue.
+def send_job_update(job_queue, stage, pct, message):
+    job_queue.put({'stage': stage, 'pct': pct, 'message': message})
+
+# This does all the heavy lifting for one job. It runs in its own thread.
+def run_analysis_job(job_queue, movie_title_from_user):
+    global pending_job_count
+    try:
+        # Load the model files if this is the first request (does nothing after that).
+        send_job_update(job_queue, 'loading_model', 5, 'Getting the model ready...')
+        _load_models()
+        
+        # Check if the model actually loaded correctly.
+        if not my_model or not my_vectorizer:
+            print("Error because model isn't loaded.")
+            job_queue.put({'stage': 'error', 'error': 'Model not loaded. Cannot perform analysis.'})
+            return
+        
+        # --- Step 1: Find the movie's ID ---
+        send_job_update(job_queue, 'finding_movie', 10, f"Looking up '{movie_title_from_user}' on TMDb...")
+        movie_id = find_movie_id_from_tmdb(movie_title_from_user)
+        if not movie_id:
+            # If we couldn't find the movie, send an error back to the user.
+            error_message = f"Could not find a movie with the title '{movie_title_from_user}'."
+            job_queue.put({'stage': 'error', 'error': error_message})
+            return
+        
+        # --- Step 2: Get the reviews for that movie ---
+        send_job_update(job_queue, 'fetching_reviews', 30, 'Fetching reviews...')
+        reviews_list = get_reviews_for_movie(movie_id)
+        if not reviews_list:
+            # If the movie exists but has no reviews, tell the user.
+            job_queue.put({'stage': 'error', 'error': 'This movie does not have any reviews on TMDb.'})
+            return
+
+        print(f"Got {len(reviews_list)} reviews to analyze.")
+
+        # --- Step 3: Use the AI model to predict sentiment ---
+        send_job_update(job_queue, 'analyzing', 70, f"Analyzing {len(reviews_list)} reviews...")
+        # This gives back a 0 (negative) or 1 (positive) for each review, skipping ones I've seen before.
+        sentiment_predictions = predict_sentiments(reviews_list)
+        
+        # --- Step 4: Count the results and prepare them to send back ---
+        print("Counting up the positive and negative results...")
+        # The predictions are already a numpy array of 0s and 1s, so numpy can count them for me
+        # way faster than looping over them in Python.
+        predictions_as_ints = sentiment_predictions.astype(np.int8)
+        positive_review_count = int(predictions_as_ints.sum())
+        negative_review_count = len(predictions_as_ints) - positive_review_count
+        
+        # Convert each prediction (0 or 1) into a word ('Positive' or 'Negative') all at once.
+        sentiment_labels = np.where(predictions_as_ints == 1, 'Positive', 'Negative').tolist()
+        
+        # Create a dictionary for each review and its result.
+        final_results_list = [
+            {'text': review_text, 'sentiment': sentiment_label}
+            for review_text, sentiment_label in zip(reviews_list, sentiment_labels)
+        ]
+
+        # --- Step 5: Send the final package of data back to the frontend ---
+        # This will be a JSON object with all the info the JavaScript needs to build the results page.
+        final_response_data = {
+            'positive_count': positive_review_count,
+            'negative_count': negative_review_count,
+            'total_reviews': len(final_results_list),
+            'reviews': final_results_list 
+        }
+        
+        print("Analysis complete! Sending results back to the user's browser.")
+        job_queue.put({'stage': 'done', 'pct': 100, 'result': final_response_data})
+    
+    except requests.RequestException as e:
+        # TMDb gave back an error or couldn't be reached at all.
+        # Don't print e itself: its message has the full URL in it, api_key and all.
+        status_code = e.response.status_code if e.response is not None else None
+        print(f"!!! TMDb request failed: {type(e).__name__} (status {status_code})")
+        job_queue.put({'stage': 'error', 'error': "Couldn't get data from TMDb right now. Please try again later."})
+    
+    except Exception as e:
+        # If anything else breaks, tell the browser instead of leaving it waiting.
+        print(f"!!! The analysis job crashed: {e}")
+        job_queue.put({'stage': 'error', 'error': 'Something went wrong while analyzing the reviews.'})
+    
+    finally:
+        # This job is finished, so there's room for another one.
+        with pending_job_count_lock:
+            pending_job_count -= 1
+
+# Formats one message the way Server-Sent Events (SSE) expect it.
+# orjson turns the dictionary straight into bytes, which is a lot faster than jsonify
+# when there are lots of long reviews in there.
+def format_sse_event(event_name, data):
+    return b"event: " + event_name.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+# This reads the updates from a job's queue and sends each one to the browser as soon as it arrives.
+def stream_job_updates(job_queue):
+    seconds_without_update = 0
+    while True:
+        try:
+            update = job_queue.get(timeout=JOB_HEARTBEAT_SECONDS)
+        except queue.Empty:
+            seconds_without_update += JOB_HEARTBEAT_SECONDS
+            if seconds_without_update >= JOB_TIMEOUT_SECONDS:
+                yield format_sse_event('failed', {'error': 'The analysis took too long. Please try again.'})
+                return
+            # A comment line, so the connection doesn't look dead to proxies and the browser.
+            yield b": still working\n\n"
+            continue
+        seconds_without_update = 0
+        
+        if update['stage'] == 'done':
+            yield format_sse_event('done', update['result'])
+            return
+        if update['stage'] == 'error':
+            # I call this 'failed' so it can't be mixed up with the browser's own 'error' events.
+            yield format_sse_event('failed', {'error': update['error']})
+            return
+        yield format_sse_event('progress', update)
+
 # This is the "API endpoint" that the JavaScript on the front-end will call.
-# It does all the heavy lifting.
+# Bad requests get a normal JSON error. Otherwise the answer is the stream of job updates.
 @app.route('/analyze', methods=['POST'])
 def handle_analysis_request():
+    global pending_job_count
     print("\nReceived a new request to analyze a movie!")
     
-    # First, check if the model even loaded correctly when the app started.
-    if not my_model or not my_vectorizer:
-        print("Error because model isn't loaded.")
-        return jsonify({'error': 'Model not loaded. Cannot perform analysis.'}), 500
-    
-    # Also check if I remembered to paste my API key.
-    if TMDB_API_KEY == "PASTE_YOUR_API_KEY_HERE":
-        print("Error because API key is missing.")
-        return jsonify({'error': 'TMDb API key is not set in app.py.'}), 500
-
     # Get the data that the JavaScript sent to us. It should be JSON.
-    request_data = request.get_json()
+    # silent=True gives back None instead of crashing if it isn't valid JSON, and cache=False
+    # because I only read it once anyway.
+    request_data = request.get_json(silent=True, cache=False)
+    if not isinstance(request_data, dict):
+        request_data = {}
     # Get the movie title from that data.
     movie_title_from_user = request_data.get('movie_title')
+    if isinstance(movie_title_from_user, str):
+        movie_title_from_user = movie_title_from_user.strip()
 
     # Make sure the user actually typed something.
     if not movie_title_from_user:
         print("Error because user didn't send a movie title.")
         return jsonify({'error': 'Movie title is required.'}), 400
+    
+    # Check the title is a sensible length and doesn't have weird invisible characters in it,
+    # before doing any real work for it.
+    if (not isinstance(movie_title_from_user, str) or len(movie_title_from_user) > MAX_MOVIE_TITLE_LENGTH
+            or not movie_title_from_user.isprintable()):
+        print("Error because the movie title doesn't look valid.")
+        return jsonify({'error': f'Movie title must be plain text of at most {MAX_MOVIE_TITLE_LENGTH} characters.'}), 400
+    
+    # Also check if I remembered to set my API key.
+    if not TMDB_API_KEY:
+        print("Error because API key is missing.")
+        return jsonify({'error': 'TMDb API key is not set. Put it in the TMDB_API_KEY environment variable.'}), 500
 
     print(f"User wants to analyze the movie: '{movie_title_from_user}'")
     
-    # --- Step 1: Find the movie's ID ---
-    movie_id = find_movie_id_from_tmdb(movie_title_from_user)
-    if not movie_id:
-        # If we couldn't find the movie, send an error back to the user.
-        error_message = f"Could not find a movie with the title '{movie_title_from_user}'."
-        return jsonify({'error': error_message}), 404
-    
-    # --- Step 2: Get the reviews for that movie ---
-    reviews_list = get_reviews_for_movie(movie_id)
-    if not reviews_list:
-        # If the movie exists but has no reviews, tell the user.
-        return jsonify({'error': 'This movie does not have any reviews on TMDb.'}), 404
-
-    print(f"Got {len(reviews_list)} reviews to analyze.")
-
-    # --- Step 3: Use the AI model to predict sentiment ---
-    # First, convert the list of review sentences into numbers using the vectorizer.
-    reviews_vectorized = my_vectorizer.transform(reviews_list)
-    # Now, use the model to predict if each review is positive (1) or negative (0).
-    sentiment_predictions = my_model.predict(reviews_vectorized)
-    
-    # --- Step 4: Count the results and prepare them to send back ---
-    print("Counting up the positive and negative results...")
-    final_results_list = []
-    positive_review_count = 0
-    negative_review_count = 0
-
-    # Loop through the original reviews and the predictions at the same time.
-    for i in range(len(reviews_list)):
-        review_text = reviews_list[i]
-        prediction = sentiment_predictions[i]
-        
-        # Convert the prediction (0 or 1) into a word ('Positive' or 'Negative').
-        if prediction == 1:
-            sentiment_label = 'Positive'
-            positive_review_count = positive_review_count + 1
-        else:
-            sentiment_label = 'Negative'
-            negative_review_count = negative_review_count + 1
-            
-        # Create a dictionary for this single review and its result.
-        result_item = {
-            'text': review_text, 
-            'sentiment': sentiment_label
-        }
-        # Add it to our list of final results.
-        final_results_list.append(result_item)
-
-    # --- Step 5: Send the final package of data back to the frontend ---
-    # This will be a JSON object with all the info the JavaScript needs to build the results page.
-    final_response_data = {
-        'positive_count': positive_review_count,
-        'negative_count': negative_review_count,
-        'total_reviews': len(final_results_list),
-        'reviews': final_results_list 
-    }
+    # Make sure there's room for another job before accepting this one.
+    with pending_job_count_lock:
+        if pending_job_count >= MAX_PENDING_JOBS:
+            print("Error because too many analysis jobs are already running.")
+            return jsonify({'error': 'The server is busy right now. Please try again in a minute.'}), 503
+        pending_job_count += 1
+    
+    # Make a new job and hand it to the job thread pool.
+    job_queue = queue.Queue()
+    send_job_update(job_queue, 'queued', 0, 'Waiting for a free spot...')
+    ANALYSIS_EXECUTOR.submit(run_analysis_job, job_queue, movie_title_from_user)
     
-    print("Analysis complete! Sending results back to the user's browser.")
-    return jsonify(final_response_data)
+    # Send the job's updates back as they come in.
+    return Response(stream_job_updates(job_queue), mimetype='text/event-stream',
+                    # Tell the browser and any proxy (like nginx) not to cache or hold back the updates.
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# If someone sends more than MAX_CONTENT_LENGTH, answer with JSON like the other errors
+# so the JavaScript can show the message.
+@app.errorhandler(413)
+def handle_request_too_large(error):
+    return jsonify({'error': 'The request is too large.'}), 413
 
 # --- This part makes the server run when I type "python app.py" ---
+# The built-in Flask server is only meant for development and handles one request at a time.
+# For real use, run it with gunicorn instead (the settings are in gunicorn_conf.py):
+#     gunicorn -c gunicorn_conf.py app:app
 if __name__ == '__main__':
-    # debug=True is super helpful, it makes the server auto-restart when I save changes.
-    app.run(debug=True)
+    if os.environ.get('FLASK_DEV'):
+        # debug=True is super helpful, it makes the server auto-restart when I save changes.
+        app.run(debug=True)
+    else:
+        print("Set FLASK_DEV=1 to use the Flask dev server, or run: gunicorn -c gunicorn_conf.py app:app")
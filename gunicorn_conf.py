@@ -0,0 +1,26 @@
+# gunicorn_conf.py - Settings for running the app with gunicorn instead of the Flask dev server
+# Start it with:  gunicorn -c gunicorn_conf.py app:app
+
+import multiprocessing
+
+from app import SERVER_THREADS
+
+# Where the server listens.
+bind = "0.0.0.0:8000"
+
+# Several worker processes, each with a few threads. Most of the time an /analyze request is
+# just waiting on TMDb, so threads let other requests run in the meantime.
+# Each /analyze holds on to a thread while its progress events stream back, so app.py only lets
+# MAX_PENDING_JOBS (a bit less than SERVER_THREADS) run at once per worker, keeping some threads
+# free for the home page and for telling extra requests the server is busy.
+workers = 2 * multiprocessing.cpu_count() + 1
+worker_class = "gthread"
+threads = SERVER_THREADS
+
+# Import app.py once in the main process and then fork the workers from it, so they all
+# share the same copy of the code. The model files are memory-mapped, so the workers also
+# share one copy of them through the OS page cache.
+preload_app = True
+
+# TMDb can be slow sometimes, so give requests a bit longer than the default.
+timeout = 60